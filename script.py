@@ -1,41 +1,160 @@
+import ipaddress
 import os
+import re
 import requests
+import shutil
+import stat
+import tempfile
+import threading
 import time
 import sys
 import yaml
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Prefer orjson for parsing API responses when installed; fall back to the stdlib json module.
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+_loads = _json.loads
+
+# Prefer the libyaml-backed C loader/dumper when available; fall back to the pure-Python ones.
+try:
+    from yaml import CSafeLoader, CSafeDumper
+except ImportError:
+    from yaml import SafeLoader as CSafeLoader, SafeDumper as CSafeDumper
 
 # --- Script-level Defaults ---
 DEFAULT_CHECK_INTERVAL_SECONDS = 300
 DEFAULT_PUBLIC_IP_SERVICE_URL = "https://api.ipify.org?format=json"
+DEFAULT_MAX_BACKOFF_MULTIPLIER = 8 # While the IP is stable, the check interval doubles per check up to this factor
 DNS_CONFIG_FILE_PATH = '/app/config/dns_config.yml'
 DEFAULT_CONFIG_TEMPLATE_PATH = '/app/dns_config.default.yml'
+CONFIG_POLL_INTERVAL_SECONDS = 5 # How often the config file is checked for edits while waiting between checks
+MAX_ADAPTIVE_INTERVAL_SECONDS = 3600 # Backoff never stretches the interval beyond this (unless configured higher)
+
+# --- Precompiled Validation ---
+_HOSTNAME_PATTERN = r'[A-Za-z0-9_](?:[A-Za-z0-9_-]{0,61}[A-Za-z0-9_])?(?:\.[A-Za-z0-9_](?:[A-Za-z0-9_-]{0,61}[A-Za-z0-9_])?)*'
+_LABEL_RE = re.compile(r'^(?:@|\*|(?:\*\.)?' + _HOSTNAME_PATTERN + r')$') # Record names: '@', '*', '*.sub' or (sub)labels
+_DOMAIN_RE = re.compile(r'^' + _HOSTNAME_PATTERN + r'$')
+_TYPE_SET = frozenset(("A", "AAAA"))
+_REQUIRED_DOMAIN_KEYS = frozenset(("domain_name", "records"))
+_REQUIRED_RECORD_KEYS = frozenset(("name", "type", "ttl"))
 
 # --- Global Variables for Configuration ---
 MIJNHOST_API_KEY = None
 CHECK_INTERVAL_SECONDS = DEFAULT_CHECK_INTERVAL_SECONDS
 PUBLIC_IP_SERVICE_URL = DEFAULT_PUBLIC_IP_SERVICE_URL
+MAX_BACKOFF_MULTIPLIER = DEFAULT_MAX_BACKOFF_MULTIPLIER
 parsed_config_data = {} # To hold the entire loaded YAML for later writing
+_ip_response_cache = {'url': None, 'ip': None, 'etag': None, 'last_modified': None} # Validators from the last IP service response
+_payload_scratch = threading.local() # Per-thread reusable PATCH payload; updates run in a thread pool
+_ts_cache = [0, ''] # [epoch second, formatted timestamp] so log lines within the same second reuse one strftime
+_record_state = {} # Last known remote record state: (domain, fqdn, type) -> (value, ttl)
+
+# --- Data Types ---
+@dataclass(slots=True, frozen=True)
+class Record:
+    """A validated DNS record to manage. The raw YAML in parsed_config_data is kept separately for writing."""
+    name: str
+    type: str
+    ttl: int
+    fqdn: str # FQDN with trailing dot, as expected by the API
+    api_url: str
+
+# --- HTTP Sessions (keep-alive connection pooling) ---
+HTTP_POOL_MAXSIZE = 16
+MAX_UPDATE_WORKERS = 8 # Concurrent DNS update requests to mijn.host; kept low so bursts don't hit its rate limit
+
+def _create_session():
+    """Creates a requests Session with a pooled, retrying HTTPAdapter mounted."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=Retry(
+            total=2,
+            backoff_factor=0.3,
+            status_forcelist=[429, 502, 503, 504],
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"PATCH"}, # Setting a record to a value is idempotent
+            raise_on_status=False, # Hand the last response to raise_for_status so API error details get logged
+            respect_retry_after_header=False # urllib3 sleeps for Retry-After without a cap; rely on backoff_factor instead
+        )
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+_ip_session = _create_session()
+_api_session = _create_session()
+_api_session.headers.update({
+    'Content-Type': 'application/json',
+    'Accept': 'application/json',
+    'User-Agent': 'DockerDDNSClient-MijnHost/2.0.0' # Version bump
+})
 
 # --- Helper Functions ---
+def dns_api_url(domain_name):
+    """Returns the mijn.host v2 DNS endpoint for a domain."""
+    return f"https://mijn.host/api/v2/domains/{domain_name}/dns"
+
+def record_fqdn(record_name, domain_name):
+    """Returns the FQDN with trailing dot as expected by the API. Empty name or '@' maps to the domain apex."""
+    if record_name == "@" or not record_name: # Allow empty name to default to "@"
+        return f"{domain_name}."
+    return f"{record_name}.{domain_name}."
+
+def _stat_config():
+    """Stats the DNS config file once, returning None if it is missing or inaccessible."""
+    try:
+        return os.stat(DNS_CONFIG_FILE_PATH)
+    except OSError:
+        return None
+
+def _config_signature(st):
+    """Change-detection key for a stat result. mtime_ns avoids float compares and catches same-second edits."""
+    return (st.st_mtime_ns, st.st_size) if st is not None else None
+
+def wait_for_next_check(timeout, last_signature):
+    """Waits up to timeout seconds, returning True early if the config file changed in the meantime."""
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(CONFIG_POLL_INTERVAL_SECONDS, remaining))
+        current_signature = _config_signature(_stat_config())
+        if current_signature is not None and current_signature != last_signature:
+            log_message(f"Change detected in '{DNS_CONFIG_FILE_PATH}' while waiting. Checking now.")
+            return True
+
 def log_message(message):
     """Prints a message to stdout, suitable for Docker logs."""
-    print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {message}", flush=True)
+    now = int(time.time())
+    if now != _ts_cache[0]:
+        _ts_cache[:] = [now, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))]
+    sys.stdout.write(f"{_ts_cache[1]} - {message}\n") # Single write keeps lines from worker threads intact
+    sys.stdout.flush()
 
 def load_and_validate_config():
     """Loads configuration from YAML, validates it, and sets global config variables."""
-    global parsed_config_data, CHECK_INTERVAL_SECONDS, PUBLIC_IP_SERVICE_URL, MIJNHOST_API_KEY
+    global parsed_config_data, CHECK_INTERVAL_SECONDS, PUBLIC_IP_SERVICE_URL, MAX_BACKOFF_MULTIPLIER, MIJNHOST_API_KEY
 
     MIJNHOST_API_KEY = os.environ.get('MIJNHOST_API_KEY')
     if not MIJNHOST_API_KEY:
         log_message("CRITICAL: MIJNHOST_API_KEY environment variable is required.")
         return None, None # Indicate fatal error
+    _api_session.headers['API-Key'] = MIJNHOST_API_KEY
 
     _last_known_ip_yaml = None
     _domain_configs_yaml = []
 
     try:
         with open(DNS_CONFIG_FILE_PATH, 'r') as f:
-            parsed_config_data = yaml.safe_load(f)
+            parsed_config_data = yaml.load(f, Loader=CSafeLoader)
         
         if not parsed_config_data: # Handle empty file after it's found
             parsed_config_data = {'global_settings': {}, 'domains': []}
@@ -45,22 +164,19 @@ def load_and_validate_config():
         log_message(f"INFO: Main DNS configuration file '{DNS_CONFIG_FILE_PATH}' not found.")
         try:
             log_message(f"Attempting to create it from default template '{DEFAULT_CONFIG_TEMPLATE_PATH}'...")
-            with open(DEFAULT_CONFIG_TEMPLATE_PATH, 'r') as f_default:
-                default_content = f_default.read()
-            
             # Ensure the target directory /app/config exists.
             # This is important because the volume mount might just be a file if ./config is a file on host.
             # However, docker-compose `volumes: - ./config:/app/config` should create /app/config if ./config is a dir.
             # For safety, especially if script is run outside Docker with similar paths, ensure dir.
             os.makedirs(os.path.dirname(DNS_CONFIG_FILE_PATH), exist_ok=True)
 
-            with open(DNS_CONFIG_FILE_PATH, 'w') as f_target: # This creates/overwrites
-                f_target.write(default_content)
+            # Copy in the kernel (sendfile on Linux) instead of reading the template into a Python string
+            shutil.copyfile(DEFAULT_CONFIG_TEMPLATE_PATH, DNS_CONFIG_FILE_PATH) # This creates/overwrites
             log_message(f"Default configuration successfully copied to '{DNS_CONFIG_FILE_PATH}'.")
 
-            # Now that the file is created, load it for the current run
+            # Now that the file is created, load it once for the current run
             with open(DNS_CONFIG_FILE_PATH, 'r') as f_newly_copied:
-                parsed_config_data = yaml.safe_load(f_newly_copied)
+                parsed_config_data = yaml.load(f_newly_copied, Loader=CSafeLoader)
             
             if not parsed_config_data: # If default template was empty or invalid YAML
                 log_message(f"WARNING: Content copied from default to '{DNS_CONFIG_FILE_PATH}' was empty or invalid YAML. Initializing with empty structure.")
@@ -72,7 +188,7 @@ def load_and_validate_config():
         except IOError as e_io:
             log_message(f"CRITICAL: IO error while creating config from default template: {e_io}. Path: {DNS_CONFIG_FILE_PATH}. Initializing with empty structure.")
             parsed_config_data = {'global_settings': {}, 'domains': []}
-        except yaml.YAMLError as e_yaml: # If the default content, once written and re-read, is bad
+        except yaml.YAMLError as e_yaml: # If the default content is bad
             log_message(f"CRITICAL: Error parsing YAML from newly copied default config '{DNS_CONFIG_FILE_PATH}': {e_yaml}. Initializing with empty structure.")
             parsed_config_data = {'global_settings': {}, 'domains': []}
         except Exception as e_fallback: # Catch-all for other unexpected errors
@@ -96,6 +212,7 @@ def load_and_validate_config():
     _last_known_ip_yaml = gs.get('last_known_ip')
     _check_interval_yaml = gs.get('check_interval_seconds')
     _public_ip_url_yaml = gs.get('public_ip_service_url')
+    _max_backoff_yaml = gs.get('max_backoff_multiplier')
 
     # Determine final global settings (YAML > Default)
     try:
@@ -111,6 +228,15 @@ def load_and_validate_config():
     if not PUBLIC_IP_SERVICE_URL.startswith(('http://', 'https://')):
         log_message(f"WARNING: Invalid public_ip_service_url ('{_public_ip_url_yaml}'). Using default: {DEFAULT_PUBLIC_IP_SERVICE_URL}.")
         PUBLIC_IP_SERVICE_URL = DEFAULT_PUBLIC_IP_SERVICE_URL
+
+    try:
+        MAX_BACKOFF_MULTIPLIER = int(_max_backoff_yaml if _max_backoff_yaml is not None else DEFAULT_MAX_BACKOFF_MULTIPLIER)
+        if MAX_BACKOFF_MULTIPLIER < 1:
+            log_message(f"WARNING: max_backoff_multiplier ('{_max_backoff_yaml}') must be at least 1. Using default: {DEFAULT_MAX_BACKOFF_MULTIPLIER}.")
+            MAX_BACKOFF_MULTIPLIER = DEFAULT_MAX_BACKOFF_MULTIPLIER
+    except (ValueError, TypeError):
+        log_message(f"WARNING: Invalid max_backoff_multiplier ('{_max_backoff_yaml}'). Using default: {DEFAULT_MAX_BACKOFF_MULTIPLIER}.")
+        MAX_BACKOFF_MULTIPLIER = DEFAULT_MAX_BACKOFF_MULTIPLIER
     
     # Ensure domains list exists
     if 'domains' not in parsed_config_data or not isinstance(parsed_config_data.get('domains'), list):
@@ -121,32 +247,43 @@ def load_and_validate_config():
     
     valid_domain_configs = []
     for i, domain_entry in enumerate(_domain_configs_yaml):
-        if not isinstance(domain_entry, dict) or not all(k in domain_entry for k in ("domain_name", "records")):
+        # Subset test on dict_keys runs in C instead of a per-key generator
+        if not isinstance(domain_entry, dict) or not _REQUIRED_DOMAIN_KEYS <= domain_entry.keys():
             log_message(f"WARNING: Domain entry at index {i} in '{DNS_CONFIG_FILE_PATH}' is invalid or missing 'domain_name'/'records'. Skipping.")
             continue
-        if not isinstance(domain_entry.get('records'), list) or not domain_entry.get('records'):
-            log_message(f"WARNING: 'records' for domain '{domain_entry.get('domain_name')}' must be a non-empty list. Skipping domain.")
+        raw_domain_name = domain_entry["domain_name"]
+        raw_records = domain_entry["records"]
+        if not isinstance(raw_records, list) or not raw_records:
+            log_message(f"WARNING: 'records' for domain '{raw_domain_name}' must be a non-empty list. Skipping domain.")
             continue
         
-        current_domain_name = str(domain_entry.get("domain_name","")).strip()
+        # Accept an absolute name ("example.com."); the trailing dot is added back when building FQDNs
+        current_domain_name = str(raw_domain_name if raw_domain_name is not None else "").strip().removesuffix(".")
         if not current_domain_name:
             log_message(f"WARNING: Domain entry at index {i} has empty or missing 'domain_name'. Skipping.")
             continue
+        if not _DOMAIN_RE.match(current_domain_name):
+            log_message(f"WARNING: Domain entry at index {i} has invalid 'domain_name' '{current_domain_name}'. Skipping.")
+            continue
 
+        domain_api_url = dns_api_url(current_domain_name) # Shared by all records of this domain
         valid_records_for_domain = []
-        for j, record_item in enumerate(domain_entry['records']):
-            if not isinstance(record_item, dict) or not all(k in record_item for k in ("name", "type", "ttl")):
+        for j, record_item in enumerate(raw_records):
+            if not isinstance(record_item, dict) or not _REQUIRED_RECORD_KEYS <= record_item.keys():
                 log_message(f"WARNING: Record (index {j}) for domain '{current_domain_name}' is invalid or missing keys (name, type, ttl). Skipping record.")
                 continue
             
-            record_name = str(record_item.get("name","")).strip()
-            record_type = str(record_item.get("type","")).upper().strip()
-            record_ttl_str = str(record_item.get("ttl","")).strip()
+            record_name = str(record_item["name"]).strip()
+            record_type = str(record_item["type"]).upper().strip()
+            record_ttl_str = str(record_item["ttl"]).strip()
 
             if not record_name:
                  log_message(f"WARNING: Record (index {j}) for domain '{current_domain_name}' has empty or missing 'name'. Skipping record.")
                  continue
-            if record_type not in ["A", "AAAA"]:
+            if not _LABEL_RE.match(record_name):
+                log_message(f"WARNING: Record (index {j}) for domain '{current_domain_name}' has invalid name '{record_name}'. Skipping record.")
+                continue
+            if record_type not in _TYPE_SET:
                 log_message(f"WARNING: Record '{record_name}' for domain '{current_domain_name}' has invalid type '{record_type}'. Skipping record.")
                 continue
             try:
@@ -158,7 +295,14 @@ def load_and_validate_config():
                 log_message(f"WARNING: Record '{record_name}' for domain '{current_domain_name}' TTL '{record_ttl_str}' is not a valid integer. Skipping record.")
                 continue
             
-            valid_records_for_domain.append({"name": record_name, "type": record_type, "ttl": record_ttl})
+            # FQDN and API URL only depend on config, so compute them once per (re)load instead of per update
+            valid_records_for_domain.append(Record(
+                name=record_name,
+                type=record_type,
+                ttl=record_ttl,
+                fqdn=record_fqdn(record_name, current_domain_name),
+                api_url=domain_api_url
+            ))
         
         if valid_records_for_domain:
             valid_domain_configs.append({"domain_name": current_domain_name, "records": valid_records_for_domain})
@@ -171,7 +315,10 @@ def load_and_validate_config():
     return _last_known_ip_yaml, valid_domain_configs
 
 def cache_ip_in_yaml(ip_address):
-    """Saves the current IP and effective global settings back to the YAML config file."""
+    """Saves the current IP and effective global settings back to the YAML config file.
+
+    Returns the config file's new signature on success (so callers don't treat their own write as an edit), else None.
+    """
     global parsed_config_data, CHECK_INTERVAL_SECONDS, PUBLIC_IP_SERVICE_URL
     if not parsed_config_data: # Should have been initialized by load_and_validate_config
         log_message("ERROR: Cannot cache IP. Configuration data structure not initialized.")
@@ -187,98 +334,188 @@ def cache_ip_in_yaml(ip_address):
     gs['last_known_ip'] = ip_address
     gs['check_interval_seconds'] = CHECK_INTERVAL_SECONDS
     gs['public_ip_service_url'] = PUBLIC_IP_SERVICE_URL
+    gs['max_backoff_multiplier'] = MAX_BACKOFF_MULTIPLIER
     
+    tmp_path = None
     try:
         # Ensure domains list is preserved even if it was empty or became empty after validation
         if 'domains' not in parsed_config_data or not isinstance(parsed_config_data.get('domains'),list):
              parsed_config_data['domains'] = []
 
+        # Keep the existing file mode, as mkstemp creates files readable by the owner only
+        try:
+            file_mode = stat.S_IMODE(os.stat(DNS_CONFIG_FILE_PATH).st_mode)
+        except OSError:
+            file_mode = 0o644
 
-        with open(DNS_CONFIG_FILE_PATH, 'w') as f:
-            yaml.dump(parsed_config_data, f, sort_keys=False, default_flow_style=False, indent=2)
-        log_message(f"IP address {ip_address} and current settings cached to {DNS_CONFIG_FILE_PATH}")
+        try:
+            # Write to a temp file in the same directory and atomically swap it in, so readers never see a torn file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(DNS_CONFIG_FILE_PATH), prefix='.dns_config.', suffix='.tmp')
+            with os.fdopen(fd, 'w', buffering=65536) as f:
+                yaml.dump(parsed_config_data, f, Dumper=CSafeDumper, sort_keys=False, default_flow_style=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, file_mode)
+            os.replace(tmp_path, DNS_CONFIG_FILE_PATH)
+            tmp_path = None
+            write_method = "atomic replace"
+        except OSError as e_atomic:
+            # The config may be a single-file bind mount (rename fails with EBUSY) or live in a directory
+            # the container user can't create files in (EACCES). Fall back to writing the file in place.
+            log_message(f"WARNING: Atomic write to {DNS_CONFIG_FILE_PATH} failed ({e_atomic}). Writing the file in place instead.")
+            with open(DNS_CONFIG_FILE_PATH, 'w') as f:
+                yaml.dump(parsed_config_data, f, Dumper=CSafeDumper, sort_keys=False, default_flow_style=False, indent=2)
+            write_method = "in-place write"
+        log_message(f"IP address {ip_address} and current settings cached to {DNS_CONFIG_FILE_PATH} ({write_method})")
+
+        return _config_signature(_stat_config())
     except IOError as e:
         log_message(f"ERROR: Could not write to config file {DNS_CONFIG_FILE_PATH}: {e}")
     except yaml.YAMLError as e:
         log_message(f"ERROR: Could not format data for YAML storage: {e}")
     except Exception as e:
         log_message(f"ERROR: Unexpected error writing to YAML: {e}")
+    finally:
+        if tmp_path is not None: # Don't leave a partial temp file behind on failure
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+    return None
 
 
 def get_public_ip():
     log_message(f"Fetching public IP from {PUBLIC_IP_SERVICE_URL}...")
     try:
-        response = requests.get(PUBLIC_IP_SERVICE_URL, timeout=10)
+        # Send conditional request headers if the service gave us validators for this URL last time
+        conditional_headers = {}
+        if _ip_response_cache['url'] == PUBLIC_IP_SERVICE_URL and _ip_response_cache['ip']:
+            if _ip_response_cache['etag']:
+                conditional_headers['If-None-Match'] = _ip_response_cache['etag']
+            if _ip_response_cache['last_modified']:
+                conditional_headers['If-Modified-Since'] = _ip_response_cache['last_modified']
+
+        response = _ip_session.get(PUBLIC_IP_SERVICE_URL, headers=conditional_headers, timeout=10)
+        if response.status_code == 304: # Not Modified: reuse the last IP without a body to parse
+            ip_address = _ip_response_cache['ip']
+            log_message(f"Current public IP: {ip_address} (not modified)")
+            return ip_address
         response.raise_for_status()
-        # Assuming the service returns JSON with an 'ip' key
-        ip_address = response.json().get('ip')
+
+        # JSON services are expected to return an 'ip' key; plain-text services return just the address
+        if 'json' in response.headers.get('Content-Type', '') or 'format=json' in PUBLIC_IP_SERVICE_URL:
+            response_json = _loads(response.content)
+            ip_address = response_json.get('ip') if isinstance(response_json, dict) else None
+        else:
+            ip_address = response.text.strip()
         if not ip_address:
-            log_message(f"ERROR: 'ip' key not found or empty in response from {PUBLIC_IP_SERVICE_URL}. Response: {response.text}")
+            log_message(f"ERROR: IP address not found or empty in response from {PUBLIC_IP_SERVICE_URL}. Response: {response.text}")
             return None
+        # Never pass on anything but an IP address (e.g. a captive portal page) to DNS records or the config
+        try:
+            if not isinstance(ip_address, str):
+                raise ValueError
+            ip_address = str(ipaddress.ip_address(ip_address))
+        except ValueError:
+            log_message(f"ERROR: Response from {PUBLIC_IP_SERVICE_URL} is not a valid IP address. Response: {response.text}")
+            return None
+        _ip_response_cache.update({
+            'url': PUBLIC_IP_SERVICE_URL,
+            'ip': ip_address,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified')
+        })
         log_message(f"Current public IP: {ip_address}")
         return ip_address
     except requests.exceptions.RequestException as e:
         log_message(f"ERROR: Could not fetch public IP from {PUBLIC_IP_SERVICE_URL}: {e}")
-    except requests.exceptions.JSONDecodeError:
+    except ValueError: # JSONDecodeError from orjson/json
         log_message(f"ERROR: Response from {PUBLIC_IP_SERVICE_URL} was not valid JSON: {response.text}")
     except Exception as e:
         log_message(f"ERROR: Unexpected error fetching public IP: {e}")
     return None
 
-def update_dns_record(ip_address, domain_name_param, record_name, record_type, record_ttl):
-    api_url = f"https://mijn.host/api/v2/domains/{domain_name_param}/dns"
-    
-    if record_name == "@" or not record_name: # Allow empty name to default to "@"
-        fqdn_record_name = f"{domain_name_param}."
-        display_name = "@"
-    else:
-        fqdn_record_name = f"{record_name}.{domain_name_param}."
-        display_name = record_name
-
-    headers = {
-        'API-Key': MIJNHOST_API_KEY,
-        'Content-Type': 'application/json',
-        'Accept': 'application/json',
-        'User-Agent': 'DockerDDNSClient-MijnHost/2.0.0' # Version bump
-    }
-    payload = {
-        "record": {
-            "type": record_type,
-            "name": fqdn_record_name, # API expects FQDN with trailing dot
-            "value": ip_address,
-            "ttl": record_ttl
-        }
-    }
+def update_dns_record(ip_address, domain_name, record: Record):
+    """Creates/updates one validated record at mijn.host, returning True on success."""
+    record_key = (domain_name, record.fqdn, record.type)
+    if _record_state.get(record_key) == (ip_address, record.ttl):
+        log_message(f"DNS record {record.name}.{domain_name} already points to {ip_address} (Type: {record.type}, TTL: {record.ttl}). Skipping update.")
+        return True
+
+    # Reuse this thread's payload dict; requests serializes it to bytes before the call returns, so nothing keeps a reference
+    payload = getattr(_payload_scratch, 'payload', None)
+    if payload is None:
+        payload = _payload_scratch.payload = {"record": {"type": None, "name": None, "value": None, "ttl": 0}}
+    record_fields = payload["record"]
+    record_fields["type"] = record.type
+    record_fields["name"] = record.fqdn # API expects FQDN with trailing dot
+    record_fields["value"] = ip_address
+    record_fields["ttl"] = record.ttl
     
-    log_message(f"Attempting to update DNS record {display_name}.{domain_name_param} to {ip_address} (Type: {record_type}, TTL: {record_ttl})")
+    log_message(f"Attempting to update DNS record {record.name}.{domain_name} to {ip_address} (Type: {record.type}, TTL: {record.ttl})")
     
     try:
         # Using PATCH as per mijn.host API v2 for creating/updating
-        response = requests.patch(api_url, headers=headers, json=payload, timeout=30)
+        response = _api_session.patch(record.api_url, json=payload, timeout=30)
         response.raise_for_status() 
         # Log more useful info from response if available
         try:
-            response_json = response.json()
-            log_message(f"DNS update successful for {display_name}.{domain_name_param}. Response: {response_json}")
-        except requests.exceptions.JSONDecodeError:
-            log_message(f"DNS update successful for {display_name}.{domain_name_param}. Status: {response.status_code}")
+            response_json = _loads(response.content)
+            log_message(f"DNS update successful for {record.name}.{domain_name}. Response: {response_json}")
+        except ValueError:
+            log_message(f"DNS update successful for {record.name}.{domain_name}. Status: {response.status_code}")
+        _record_state[record_key] = (ip_address, record.ttl)
         return True
     except requests.exceptions.HTTPError as http_err:
-        error_message = f"HTTP error during DNS update for {display_name}.{domain_name_param}: {http_err}"
+        error_message = f"HTTP error during DNS update for {record.name}.{domain_name}: {http_err}"
         try:
             # Attempt to get more detailed error from API response
-            error_details = http_err.response.json()
+            error_details = _loads(http_err.response.content)
             error_message += f" - Details: {error_details}"
-        except (requests.exceptions.JSONDecodeError, AttributeError):
+        except (ValueError, AttributeError):
             if hasattr(http_err.response, 'text'):
                  error_message += f" - Response content: {http_err.response.text}"
         log_message(error_message)
     except requests.exceptions.RequestException as e:
-        log_message(f"Network/Request error during DNS update for {display_name}.{domain_name_param}: {e}")
+        log_message(f"Network/Request error during DNS update for {record.name}.{domain_name}: {e}")
     except Exception as e:
-        log_message(f"Unexpected error during DNS update for {display_name}.{domain_name_param}: {e}")
+        log_message(f"Unexpected error during DNS update for {record.name}.{domain_name}: {e}")
     return False
 
+def prime_record_state(domain_configs):
+    """Fetches current DNS records for each configured domain so no-op updates can be skipped after a restart."""
+    for domain_config in domain_configs:
+        domain_name = domain_config['domain_name']
+        try:
+            response = _api_session.get(dns_api_url(domain_name), timeout=30)
+            response.raise_for_status()
+            remote_records = _loads(response.content).get('data', {}).get('records', [])
+            for remote in remote_records:
+                _record_state[(domain_name, remote.get('name'), remote.get('type'))] = (remote.get('value'), remote.get('ttl'))
+            log_message(f"Fetched {len(remote_records)} existing DNS records for domain: {domain_name}")
+        except requests.exceptions.RequestException as e:
+            log_message(f"WARNING: Could not fetch existing DNS records for {domain_name}: {e}. Records will be updated unconditionally.")
+        except (ValueError, AttributeError) as e:
+            log_message(f"WARNING: Unexpected DNS records response for {domain_name}: {e}. Records will be updated unconditionally.")
+
+def update_all_records(ip_address, domain_configs):
+    """Updates every configured record concurrently, returning True only if every record succeeded."""
+    # mijn.host's PATCH endpoint accepts a single 'record' per request (PUT would replace the whole zone),
+    # so each record is its own request; running them in parallel over the shared keep-alive session
+    # makes a full update pass take about as long as the slowest single request.
+    jobs = []
+    for domain_config in domain_configs:
+        log_message(f"Processing updates for domain: {domain_config['domain_name']}")
+        jobs.extend((domain_config['domain_name'], record) for record in domain_config['records'])
+
+    with ThreadPoolExecutor(max_workers=min(MAX_UPDATE_WORKERS, len(jobs))) as ex:
+        futures = [
+            ex.submit(update_dns_record, ip_address, domain_name, record)
+            for domain_name, record in jobs
+        ]
+        # Collect every result (no short-circuit) so all records are attempted even if one fails
+        return all([f.result() for f in as_completed(futures)])
+
 # --- Main Execution Logic ---
 if __name__ == "__main__":
     log_message("DDNS Client for mijn.host started (YAML configuration with mtime check).")
@@ -291,14 +528,12 @@ if __name__ == "__main__":
         log_message("CRITICAL: MIJNHOST_API_KEY environment variable is not set on startup. Exiting.")
         sys.exit(1)
     
-    # Store initial modification time
-    try:
-        dns_config_last_modified_time = os.path.getmtime(DNS_CONFIG_FILE_PATH)
-    except OSError:
+    # Store initial file signature (mtime_ns, size)
+    dns_config_last_signature = _config_signature(_stat_config())
+    if dns_config_last_signature is None: # Treat as if it's non-existent
         log_message(f"INFO: DNS configuration file '{DNS_CONFIG_FILE_PATH}' not found on startup or error accessing it. Will attempt to load if created.")
-        dns_config_last_modified_time = 0 # Treat as if it's very old or non-existent
 
-    log_message(f"Initial effective check interval: {CHECK_INTERVAL_SECONDS} seconds.")
+    log_message(f"Initial effective check interval: {CHECK_INTERVAL_SECONDS} seconds (backing off up to {MAX_BACKOFF_MULTIPLIER}x while the IP is stable, max {max(CHECK_INTERVAL_SECONDS, MAX_ADAPTIVE_INTERVAL_SECONDS)}s).")
     log_message(f"Initial effective public IP service URL: {PUBLIC_IP_SERVICE_URL}.")
     log_message(f"DNS configuration file: {DNS_CONFIG_FILE_PATH}")
 
@@ -309,71 +544,89 @@ if __name__ == "__main__":
 
     if not domain_configurations:
         log_message("WARNING: No domains configured initially. Script will run and can cache IP, but won't update DNS records until domains are added to config.")
+    else:
+        prime_record_state(domain_configurations)
 
+    # Schedule checks against a monotonic deadline so slow update cycles don't push later checks back
+    next_deadline = time.monotonic()
+    backoff_multiplier = 1 # Doubles with each check where the IP matched the config; drives the adaptive interval
     while True:
         # --- Check if config file has been modified ---
-        current_mtime = None
-        try:
-            current_mtime = os.path.getmtime(DNS_CONFIG_FILE_PATH)
-        except OSError: # File might have been deleted or is inaccessible
-            if dns_config_last_modified_time is not None and dns_config_last_modified_time != 0 : # It existed before
+        current_signature = _config_signature(_stat_config()) # Single stat per cycle
+        if current_signature is None: # File might have been deleted or is inaccessible
+            if dns_config_last_signature is not None: # It existed before
                 log_message(f"WARNING: DNS configuration file '{DNS_CONFIG_FILE_PATH}' is no longer accessible or has been deleted. Using last known configuration or defaults.")
-            # If file never existed or was marked as 0, no new message needed here.
-            dns_config_last_modified_time = 0 # Mark as needing load if it reappears or becomes accessible
+            # If file never existed or was already marked missing, no new message needed here.
+            dns_config_last_signature = None # Mark as needing load if it reappears or becomes accessible
 
-        if current_mtime is not None and current_mtime != dns_config_last_modified_time:
+        if current_signature is not None and current_signature != dns_config_last_signature:
             log_message(f"Change detected in '{DNS_CONFIG_FILE_PATH}'. Reloading configuration.")
             # Reload config and update globals
             cached_ip_from_config, domain_configurations = load_and_validate_config()
-            dns_config_last_modified_time = current_mtime # Update mtime after successful load
+            dns_config_last_signature = current_signature # Update signature after successful load
+            next_deadline = time.monotonic() # Restart the schedule from now, the interval may have changed
+            backoff_multiplier = 1
 
             if MIJNHOST_API_KEY is None: # Check if API key became unset after reload
                 log_message("CRITICAL: MIJNHOST_API_KEY is no longer set after config reload. Waiting before retry.")
                 time.sleep(DEFAULT_CHECK_INTERVAL_SECONDS) # Use a default safe interval
+                next_deadline = time.monotonic() # The wait above already covered this interval
                 continue # Restart loop to try reloading
 
             if domain_configurations is None: # Critical YAML/file error during reload
                 log_message("CRITICAL: Failed to load or validate configuration after detected change. Retrying after interval.")
                 # Use CHECK_INTERVAL_SECONDS which would be the last valid one, or default if never valid.
-                time.sleep(CHECK_INTERVAL_SECONDS if CHECK_INTERVAL_SECONDS > 0 else DEFAULT_CHECK_INTERVAL_SECONDS)
+                # Wake early if the file is fixed in the meantime.
+                wait_for_next_check(CHECK_INTERVAL_SECONDS if CHECK_INTERVAL_SECONDS > 0 else DEFAULT_CHECK_INTERVAL_SECONDS, dns_config_last_signature)
+                next_deadline = time.monotonic() # The wait above already covered this interval
                 continue # Restart loop
             
-            log_message(f"Config reloaded. Current check interval: {CHECK_INTERVAL_SECONDS}s. IP Service: {PUBLIC_IP_SERVICE_URL}")
+            log_message(f"Config reloaded. Current check interval: {CHECK_INTERVAL_SECONDS}s (max backoff {MAX_BACKOFF_MULTIPLIER}x). IP Service: {PUBLIC_IP_SERVICE_URL}")
+            # Records may have been changed elsewhere or domains added, so refresh the remote state from scratch
+            _record_state.clear()
             if not domain_configurations:
                 log_message("WARNING: No domains configured to manage after reload.")
+            else:
+                prime_record_state(domain_configurations)
         
         # --- Get current public IP ---
         current_public_ip = get_public_ip()
         
         if current_public_ip:
             if current_public_ip != cached_ip_from_config:
+                backoff_multiplier = 1
                 log_message(f"Public IP ('{current_public_ip}') differs from IP in config ('{cached_ip_from_config if cached_ip_from_config else 'N/A'}'). Update required.")
                 
                 if not domain_configurations:
                     log_message("IP changed, but no domains configured. Caching new IP.")
-                    cache_ip_in_yaml(current_public_ip)
+                    written_signature = cache_ip_in_yaml(current_public_ip)
+                    if written_signature is not None: # Our own write is not a config edit
+                        dns_config_last_signature = written_signature
                     cached_ip_from_config = current_public_ip # Update in-memory cache
                 else:
-                    all_updates_successful_for_new_ip = True
-                    for domain_config in domain_configurations:
-                        domain_name = domain_config['domain_name']
-                        log_message(f"Processing updates for domain: {domain_name}")
-                        for record in domain_config['records']:
-                            if not update_dns_record(current_public_ip, domain_name, record['name'], record['type'], record['ttl']):
-                                all_updates_successful_for_new_ip = False
-                                # Continue trying other records/domains even if one fails
+                    all_updates_successful_for_new_ip = update_all_records(current_public_ip, domain_configurations)
                     
                     if all_updates_successful_for_new_ip:
                         log_message(f"All DNS updates successful for new IP {current_public_ip}. Caching IP.")
-                        cache_ip_in_yaml(current_public_ip)
+                        written_signature = cache_ip_in_yaml(current_public_ip)
+                        if written_signature is not None: # Our own write is not a config edit
+                            dns_config_last_signature = written_signature
                         cached_ip_from_config = current_public_ip # Update in-memory cache
                     else:
                         log_message(f"One or more DNS updates failed for new IP {current_public_ip}. IP will not be cached. Will retry next cycle.")
             else:
                 log_message(f"Public IP ({current_public_ip}) matches IP in config. No DNS update needed.")
+                backoff_multiplier = min(backoff_multiplier * 2, MAX_BACKOFF_MULTIPLIER)
         else:
             log_message("Could not determine public IP. Skipping DNS update check for this cycle.")
+            backoff_multiplier = 1
             
-        # CHECK_INTERVAL_SECONDS would have been updated if config was reloaded
-        log_message(f"Waiting for {CHECK_INTERVAL_SECONDS} seconds before next check...")
-        time.sleep(CHECK_INTERVAL_SECONDS)
+        # CHECK_INTERVAL_SECONDS would have been updated if config was reloaded.
+        # A stable IP stretches the interval (adaptive backoff); any change or error resets it to the configured value.
+        # max_backoff_multiplier: 1 disables the backoff.
+        effective_interval = min(CHECK_INTERVAL_SECONDS * backoff_multiplier, max(CHECK_INTERVAL_SECONDS, MAX_ADAPTIVE_INTERVAL_SECONDS))
+        # Never schedule in the past, so an overrun doesn't cause a burst of back-to-back checks
+        next_deadline = max(next_deadline + effective_interval, time.monotonic())
+        sleep_for = max(0.0, next_deadline - time.monotonic())
+        log_message(f"Waiting for {sleep_for:.0f} seconds before next check (or until config changes)...")
+        wait_for_next_check(sleep_for, dns_config_last_signature)